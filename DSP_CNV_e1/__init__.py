@@ -12,6 +12,7 @@ safteryfirst = verify string contains no 'dangerous' symbols'
 file_removal = remove list of files without raising critical errors
 fileLines = count lines in a file
 fastqReads = count sequence reads in fastq file
+scanSAM = single pass over sam file returning all alignment summaries
 samSummary = provide unaligned, aligned, and specific target alignment counts
 samToDCC = convert SAM to DCC-like file
 splitSam = split sam file based on dsp tag id
@@ -26,14 +27,22 @@ dccfile = object containing information of dcc / dcc-like file
 
 """
 
-import csv
 import datetime
 import gzip
+import io
 import collections
-import re
+import functools
+import mmap
 import os
+import zlib
 import logging
+import numpy as np
 import pandas as pd
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
 
 # Logging Stuff
 logging.basicConfig(level=logging.DEBUG, format=('%(asctime)s - %(levelname)s '
@@ -42,6 +51,40 @@ logging.basicConfig(level=logging.DEBUG, format=('%(asctime)s - %(levelname)s '
 file_version = '0.01'
 soft_version = '0.01'
 
+# DCC-like file layout written by samToDCC. Kept as bytes so each file
+# is produced with a single C level bytes % formatting call.
+_DCC_HEADER_TMPL = (b"<Header>\n"
+                    b"FileVersion,%s\n"
+                    b"SoftwareVersion,%s\n"
+                    b"Date,%s\n"
+                    b"</Header>\n\n"
+
+                    b"<Scan_Attributes>\n"
+                    b"ID,%s\n"
+                    b"Plate_ID,%s\n"
+                    b"Well,%s\n"
+                    b"</Scan_Attributes>\n\n"
+
+                    b"<NGS_Processing_Attributes>\n"
+                    b"seqSetID,%s\n"
+                    b"tamperedIni,No\n"
+                    b"trimGaloreOpts,%s\n"
+                    b"flash2Opts,%s\n"
+                    b"umiExtractOpts,%s\n"
+                    b"bowtie2Opts,%s\n"
+                    b"umiDedupOpts,%s\n"
+                    b"umiLimit,%s\n"
+                    b"Raw,%d\n"
+                    b"Trimmed,%d\n"
+                    b"Stitched,%d\n"
+                    b"Aligned,%d\n"
+                    b"Overcounts,%s\n"
+                    b"</NGS_Processing_Attributes>\n\n"
+
+                    b"<Code_Summary>\n")
+_DCC_FOOTER = (b"</Code_Summary>\n\n"
+               b"SOMEHASH100000000000")
+
 # safteryfirst
 #    Function to verify a string is safe for execution
 #    INPUT:
@@ -66,6 +109,79 @@ def file_removal(filenames):
         except:
             logging.warning('Could not remove %s.' % fh)
 
+# _countNewlines
+#     Count lines in an open binary file handle by reading large
+#     blocks and counting newline bytes (avoids per-line iteration).
+#     A final line without a trailing newline is still counted.
+#     INPUT:
+#        fh = file handle opened in binary mode
+#     OUTPUT:
+#        Number of lines read from the handle as int
+def _countNewlines(fh, blockSize=1 << 20):
+    count = 0
+    lastByte = b'\n'
+    while True:
+        buf = fh.read(blockSize)
+        if not buf:
+            break
+        count += buf.count(b'\n')
+        lastByte = buf[-1:]
+    if lastByte != b'\n':
+        count += 1
+    return count
+
+# _countGzipNewlines
+#     Count lines in a gzipped file by feeding raw blocks straight to
+#     zlib rather than going through the gzip.GzipFile wrapper.
+#     Concatenated gzip members are supported.
+#     INPUT:
+#        fName = gzipped file name
+#     OUTPUT:
+#        Number of lines in the decompressed file as int
+def _countGzipNewlines(fName, blockSize=1 << 20):
+    maxOut = 4 * blockSize
+    count = 0
+    lastByte = b'\n'
+    # wbits=31 expects a gzip header and trailer
+    decomp = zlib.decompressobj(31)
+    started = False
+    fd = os.open(fName, os.O_RDONLY)
+    try:
+        while True:
+            chunk = os.read(fd, blockSize)
+            if not chunk:
+                break
+            while True:
+                if not started:
+                    # Skip zero padding after the last member
+                    chunk = chunk.lstrip(b'\x00')
+                    if not chunk:
+                        break
+                    started = True
+                out = decomp.decompress(chunk, maxOut)
+                if out:
+                    count += out.count(b'\n')
+                    lastByte = out[-1:]
+                if decomp.eof:
+                    # Start over on the next gzip member, if any
+                    chunk = decomp.unused_data
+                    decomp = zlib.decompressobj(31)
+                    started = False
+                    if not chunk:
+                        break
+                    continue
+                chunk = decomp.unconsumed_tail
+                if not chunk and len(out) < maxOut:
+                    break
+    finally:
+        os.close(fd)
+    if started:
+        raise EOFError('Compressed file ended before the end-of-stream '
+                       'marker was reached: %s' % fName)
+    if lastByte != b'\n':
+        count += 1
+    return count
+
 # fileLines
 #     Function to count lines in a file.
 #     INPUT:
@@ -74,28 +190,145 @@ def file_removal(filenames):
 #        Number of lines in file as int
 def fileLines(fName):
     if fName.endswith('.gz'):
-        # Open gzipped file
-        with gzip.open(fName, 'rb') as fh:
-            for i, _line in enumerate(fh):
-                pass
+        return _countGzipNewlines(fName)
     else:
-        with open(fName) as fh:
-            for i, _line in enumerate(fh):
-                pass
-    return i + 1
+        with open(fName, 'rb') as fh:
+            return _countNewlines(fh)
     
 # fastqReads
 #     Function to count reads in fastq file
 #     INPUT:
 #        fName = fastq file name (gzipped supported)
 #     OUTPUT:
-#        Number of sequencing reads as int
+#        Number of sequencing reads as int (0 if the file is missing,
+#        empty, or not readable/decompressible)
 def fastqReads(fName):
     try:
-        return fileLines(fName) / 4
-    except:
+        # No need to count lines of an empty file
+        if os.path.getsize(fName) == 0:
+            return 0
+        return fileLines(fName) // 4
+    except (OSError, EOFError, zlib.error):
         return 0
 
+# _gatherFields
+#    Copy variable length byte fields out of a buffer into a numpy array.
+#        Short fields are gathered into a fixed width bytes array one byte
+#        column at a time so no (fields x width) index array is ever
+#        built. Blocks with a field longer than maxWidth, or ending in a
+#        NUL byte (which the fixed width dtype would drop), are sliced
+#        per field into an object array instead.
+#    INPUT:
+#        buf = numpy uint8 array
+#        starts = numpy array of field start offsets in buf
+#        ends = numpy array of field end offsets in buf (exclusive)
+#        maxWidth = widest field gathered into a fixed width array
+#    OUTPUT:
+#        numpy 'S' or object array of bytes with one entry per field
+def _gatherFields(buf, starts, ends, maxWidth=64):
+    lens = ends - starts
+    width = max(int(lens.max()), 1) if len(lens) else 1
+    if width > maxWidth or (buf[ends[lens > 0] - 1] == 0).any():
+        raw = buf.tobytes()
+        return np.array([ raw[s:e] for s, e in
+                          zip(starts.tolist(), ends.tolist()) ],
+                        dtype=object)
+    mat = np.zeros((len(starts), width), dtype=np.uint8)
+    for j in range(width):
+        inField = lens > j
+        mat[inField, j] = buf[starts[inField] + j]
+    return mat.view('S%d' % width).ravel()
+
+# _samBlockFields
+#    Locate the RNAME of every alignment record in a block of whole
+#        sam lines using vectorized byte searches instead of a per-line
+#        loop
+#    INPUT:
+#        buf = numpy uint8 array of complete sam lines
+#    OUTPUT:
+#        numpy 'S' array of targets (b'*' when unaligned)
+def _samBlockFields(buf):
+    # Line spans, the last line may lack a newline
+    ends = np.flatnonzero(buf == 0x0A)
+    if buf[-1] != 0x0A:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Skip blank lines and '@' header lines
+    keep = (ends > starts) & (buf[starts] != 0x40)
+    starts = starts[keep]
+    ends = ends[keep]
+    # Second and third tab of each line enclose RNAME
+    tabs = np.flatnonzero(buf == 0x09)
+    t = np.searchsorted(tabs, starts)
+    valid = t + 1 < len(tabs)
+    valid[valid] = tabs[t[valid] + 1] < ends[valid]
+    starts = starts[valid]
+    ends = ends[valid]
+    t = t[valid]
+    rStarts = tabs[t + 1] + 1
+    t2 = np.minimum(t + 2, len(tabs) - 1)
+    rEnds = np.where((t + 2 < len(tabs)) & (tabs[t2] < ends), tabs[t2], ends)
+    # Drop the '\r' of CRLF files when RNAME is the last field
+    rEnds = rEnds - ((rEnds > rStarts) & (buf[rEnds - 1] == 0x0D))
+    return _gatherFields(buf, rStarts, rEnds)
+
+# _samBlocks
+#    Memory map a sam file and yield the record fields of blocks of
+#        whole lines (blocks keep the temporary arrays small)
+#    INPUT:
+#        sam = sam file name
+#        blockSize = approximate block size in bytes
+#    OUTPUT:
+#        yields the RNAME array from _samBlockFields for each block
+def _samBlocks(sam, blockSize=32 << 20):
+    with open(sam, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        # Empty files cannot be memory mapped
+        if size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < size:
+                # Extend block to the end of its last line
+                end = min(pos + blockSize, size)
+                if end < size:
+                    nl = mm.rfind(b'\n', pos, end)
+                    if nl == -1:
+                        nl = mm.find(b'\n', end)
+                    end = size if nl == -1 else nl + 1
+                # Parse a copy of the block, a view into the map left
+                # alive by an exception would stop the map from closing
+                yield _samBlockFields(np.frombuffer(mm[pos:end],
+                                                    dtype=np.uint8))
+                pos = end
+
+# scanSAM
+#    Single pass over a sam file collecting every summary needed
+#        downstream (samSummary, samToDCC, summaryInfo.update)
+#    INPUT:
+#        sam = sam file name
+#    OUTPUT:
+#        aligned = number of sequences which did align to
+#            a target sequence as an int
+#        unaligned = number of reads which did not align to
+#            a target sequence as an int
+#        tags = dictionary with targets (str) as keys and
+#            aligned read counts (int) as values
+def scanSAM(sam):
+    aligned = 0
+    unaligned = 0
+    tags = collections.Counter()
+    for rnames in _samBlocks(sam):
+        isUnaligned = rnames == b'*'
+        nUnaligned = int(np.count_nonzero(isUnaligned))
+        unaligned += nUnaligned
+        aligned += len(rnames) - nUnaligned
+        # Hash counting keeps tags in order of first appearance
+        blockTags = collections.Counter(rnames[~isUnaligned].tolist())
+        for tag, n in blockTags.items():
+            tags[tag.decode()] += n
+    return aligned, unaligned, dict(tags)
+
 # samSummary
 #    Function to count number of aligned reads in sam file
 #        and number of reads aligned to each target
@@ -109,17 +342,7 @@ def fastqReads(fName):
 #        targets = dictionary with targets (str) as keys and
 #            aligned read counts (int) as values
 def samSummary(sam):
-    unaligned = 0; aligned = 0; targets = {}
-    with open(sam) as fh:
-        for line in csv.reader(fh, delimiter='\t'):
-            if line[0].startswith('@'): 
-                pass
-            elif line[2] == '*':
-                unaligned += 1
-            else:
-                aligned += 1
-                targ = line[2]
-                targets[targ] = targets.setdefault(targ, 0) + 1
+    aligned, unaligned, targets = scanSAM(sam)
     return unaligned, aligned, targets
 
 # samToDCC
@@ -136,124 +359,242 @@ def samSummary(sam):
 #        owner = file owner
 #        comments = any extra information
 #        seqKit = sequencing kit used
-#        dateTag = date of dcc generation
+#        dateTag = date of dcc generation (defaults to today)
+#        samScan = output of scanSAM for samFile if already available,
+#            avoids reading samFile again
 #    OUTPUT:
 #        writes dcc file
 def samToDCC(samFile, dccfname, sumObj,
              seqSetID, trimOpts, flash2Opts, 
              umiExtractOpts, bowtie2Opts, umiDedupOpts, umiLimit,
              overcounts = '', plateid='1012207777777', wellid='A01', 
-             dateTag=datetime.datetime.today().strftime('%Y-%m-%d')):
-    tags = {}
-    with open(samFile) as fh:
-        for line in csv.reader(fh, delimiter='\t'):
-            if line[0].startswith('@'): continue
-            dspTag = line[2]
-            if dspTag == '*': continue
-            tags[dspTag] = tags.setdefault(dspTag, 0) + 1
-    out = open(dccfname, 'w')
-    out.write(("<Header>\n"
-              "FileVersion,%s\n"
-              "SoftwareVersion,%s\n"
-              "Date,%s\n"
-              "</Header>\n\n"
-              
-              "<Scan_Attributes>\n"
-              "ID,%s\n"
-              "Plate_ID,%s\n"
-              "Well,%s\n"
-              "</Scan_Attributes>\n\n"
-              
-              "<NGS_Processing_Attributes>\n"
-              "seqSetID,%s\n"
-              "tamperedIni,No\n"
-              "trimGaloreOpts,%s\n"
-              "flash2Opts,%s\n"
-              "umiExtractOpts,%s\n"
-              "bowtie2Opts,%s\n"
-              "umiDedupOpts,%s\n"
-              "umiLimit,%s\n"
-              "Raw,%d\n"
-              "Trimmed,%d\n"
-              "Stitched,%d\n"
-              "Aligned,%d\n"
-              "Overcounts,%s\n"
-              "</NGS_Processing_Attributes>\n\n"
-              
-              "<Code_Summary>\n"
-              "%s\n"
-              "</Code_Summary>\n\n"
-              
-              "SOMEHASH100000000000" % ( file_version, soft_version, dateTag,
-                  sumObj.fRoot, plateid, wellid, seqSetID, trimOpts, flash2Opts, 
-                  umiExtractOpts, bowtie2Opts, umiDedupOpts, umiLimit,
-                  sumObj.vals['Raw'], sumObj.vals['Trimmed'], 
-                  sumObj.vals['Stitched'], sumObj.vals['Aligned'], 
-                  overcounts,
-                  '\n'.join(['%s,%d' % (tag, tCount) for tag, tCount in 
-                             tags.items()])
-                  )))
+             dateTag=None, samScan=None):
+    if dateTag is None:
+        dateTag = datetime.date.today().isoformat()
+    if samScan is None:
+        samScan = scanSAM(samFile)
+    _aligned, _unaligned, tags = samScan
+    # Text fields are encoded here, counts are formatted by %d
+    textFields = tuple(str(x).encode() for x in (
+        file_version, soft_version, dateTag, sumObj.fRoot, plateid, wellid,
+        seqSetID, trimOpts, flash2Opts, umiExtractOpts, bowtie2Opts,
+        umiDedupOpts, umiLimit))
+    with open(dccfname, 'wb', buffering=1 << 20) as out:
+        out.write(_DCC_HEADER_TMPL % (textFields + (
+            sumObj.vals['Raw'], sumObj.vals['Trimmed'],
+            sumObj.vals['Stitched'], sumObj.vals['Aligned'],
+            str(overcounts).encode())))
+        # Stream one line per tag rather than building the whole section
+        for tag, tCount in tags.items():
+            out.write(b'%s,%d\n' % (tag.encode(), tCount))
+        if not tags:
+            out.write(b'\n')
+        out.write(_DCC_FOOTER)
     
+# _lineBlocks
+#    Read an open binary file in blocks of whole lines
+#    INPUT:
+#        fh = file handle opened in binary mode
+#        blockSize = approximate block size in bytes
+#    OUTPUT:
+#        yields bytes blocks ending on '\n' (the last block may not if
+#            the file does not end with a newline)
+def _lineBlocks(fh, blockSize=1 << 20):
+    while True:
+        block = fh.read(blockSize)
+        if not block:
+            return
+        # Finish the last line of the block
+        if not block.endswith(b'\n'):
+            block += fh.readline()
+        yield block
+
+# _hasHeaderLine
+#    Check whether a block of sam lines contains an '@' line. Looks at
+#        the byte after each newline with numpy, a substring search for
+#        b'\n@' is slow because '@' is common in quality strings.
+#    INPUT:
+#        block = bytes block starting at the start of a line
+#    OUTPUT:
+#        True if any line of the block starts with '@'
+def _hasHeaderLine(block):
+    buf = np.frombuffer(block, dtype=np.uint8)
+    if len(buf) == 0:
+        return False
+    nl = np.flatnonzero(buf[:-1] == 0x0A)
+    return bool(buf[0] == 0x40 or (buf[nl + 1] == 0x40).any())
+
+# _samHeaderLines
+#    Collect every '@' line of a sam file, wherever it appears (as
+#        grep ^@ did). Blocks without an '@' line are skipped without
+#        being split.
+#    INPUT:
+#        fh = SAM file handle opened in binary mode
+#    OUTPUT:
+#        list of header lines as bytes, with their line endings
+def _samHeaderLines(fh):
+    lines = []
+    for block in _lineBlocks(fh):
+        if _hasHeaderLine(block):
+            pieces = block.split(b'\n')
+            tail = pieces.pop()
+            lines.extend(p + b'\n' for p in pieces if p.startswith(b'@'))
+            if tail.startswith(b'@'):
+                lines.append(tail)
+    return lines
+
+# _maxOpenFiles
+#    Number of files a function may keep open: the soft open file
+#        limit less some headroom for other handles
+#    INPUT:
+#        headroom = handles left for everything else
+#    OUTPUT:
+#        int
+def _maxOpenFiles(headroom=64):
+    if resource is None:
+        return 256
+    soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft == resource.RLIM_INFINITY:
+        return 4096
+    return max(soft - headroom, 16)
+
 # splitSam
 #    splits a sam file in to seperate sam files for each tag
 #    INPUT:
 #        samFile = name of sam file as string
+#        maxOpen = maximum number of output files kept open at once,
+#            least recently used files are closed and reopened in
+#            append mode when needed again. Defaults to the open file
+#            limit less some headroom.
+#        flushSize = bytes of records buffered per tag before they are
+#            written to its file
 #    OUTPUT:
 #        outFiles = dictionary with sam file names as strings
 #            for keys and max count for individual UMI assigned
 #            to the file as an int (used to determine if deduplication
 #            at a hamming distance > 0 is feasible).
 #        alnCount = count of total aligned reads as int
-def splitSAM(samFile):
-    # Storage Dictionary
-    linesByTag = {}
-    # Loop through file
-    with open(samFile) as fh:
-        # Header Storage 
-        header = ''
-        alnCount = 0
-        umiCounts = {}
-        for line in fh:
-            # Store then skip header lines
-            if line.startswith('@'):
-                header += line 
-                continue
-            # Extract dsptagID and umi sequence
-            qId, _flg, dsptagID = line.rstrip().split('\t')[0:3]
-            if dsptagID == '*':
-                continue
-            # Update summary information
+def splitSAM(samFile, maxOpen=None, flushSize=1 << 16):
+    if maxOpen is None:
+        maxOpen = _maxOpenFiles()
+    # Records waiting to be written per tag, '\n' separated with no
+    # newline after the last one
+    pending = {}
+    # Open output files per tag, least recently used first
+    writers = collections.OrderedDict()
+    outNames = {}
+
+    # Write the pending records of a tag, (re)opening its file if needed
+    def flush(dsptagID):
+        out = writers.get(dsptagID)
+        if out is not None:
+            writers.move_to_end(dsptagID)
+        else:
+            # Stay under the open file limit
+            if len(writers) >= maxOpen:
+                writers.popitem(last=False)[1].close()
+            if dsptagID in outNames:
+                out = open(outNames[dsptagID], 'ab')
             else:
+                outName = samFile.replace(
+                    '.sam', '_%s.sam' % dsptagID.decode())
+                out = open(outName, 'wb')
+                out.write(headerBytes)
+                outNames[dsptagID] = outName
+            writers[dsptagID] = out
+        buf = pending[dsptagID]
+        out.write(buf)
+        del buf[:]
+
+    # Loop through file
+    try:
+        with open(samFile, 'rb') as fh:
+            # Every '@' line of the file goes in the per tag headers,
+            # keeping '\n' line endings as text mode reading did
+            headerBytes = b''.join(
+                line[:-2] + b'\n' if line.endswith(b'\r\n') else line
+                for line in _samHeaderLines(fh))
+            fh.seek(0)
+            alnCount = 0
+            # Only the number of distinct UMIs per tag is reported
+            umiCounts = collections.defaultdict(set)
+            for line in fh:
+                # Skip header lines
+                if line.startswith(b'@'):
+                    continue
+                # Extract dsptagID and umi sequence, splitting no further
+                # than the RNAME field
+                record = line.rstrip()
+                qId, _flg, dsptagID = record.split(b'\t', 3)[0:3]
+                if dsptagID == b'*':
+                    continue
+                # Update summary information
                 alnCount += 1
-                umi = qId.split('_')[-1]
-                umiCounts.setdefault(dsptagID, {})
-                umiCounts[dsptagID][umi] = umiCounts[dsptagID].setdefault(umi, 0) + 1
-                # Add line to dictionary
-                linesByTag.setdefault(dsptagID, [])
-                linesByTag[dsptagID].append(line.rstrip())
+                umiCounts[dsptagID].add(qId.split(b'_')[-1])
+                # Queue record for its tag, the buffer is kept after a
+                # flush so later records still get their separator
+                buf = pending.get(dsptagID)
+                if buf is None:
+                    pending[dsptagID] = buf = bytearray(record)
+                else:
+                    buf += b'\n'
+                    buf += record
+                if len(buf) >= flushSize:
+                    flush(dsptagID)
+        for dsptagID, buf in pending.items():
+            if buf:
+                flush(dsptagID)
+    finally:
+        for out in writers.values():
+            out.close()
     
-    # Write outputs
-    outFiles = {}
-    for dsptagID, tagLines in linesByTag.items():
-        outName = samFile.replace('.sam', '_%s.sam' % dsptagID)
-        outFiles[outName] = len(umiCounts[dsptagID])
-        out = open(outName, 'w') 
-        out.write('%s%s' % (header, '\n'.join(tagLines)))
-        out.close()
+    outFiles = { outNames[dsptagID]: len(umis) 
+                 for dsptagID, umis in umiCounts.items() }
     return outFiles, alnCount
 
+# _copySAMRecords
+#    Stream the lines of an open SAM file that do not start with '@'
+#        to an output handle (as grep -v ^@ did), optionally writing
+#        all of its '@' lines first
+#    INPUT:
+#        fh = SAM file handle opened in binary mode
+#        out = output file handle opened in binary mode
+#        keepHeader = write the '@' header lines as well if True
+#    OUTPUT:
+#        NA
+def _copySAMRecords(fh, out, keepHeader=False):
+    if keepHeader:
+        for line in _samHeaderLines(fh):
+            out.write(line if line.endswith(b'\n') else line + b'\n')
+        fh.seek(0)
+    for block in _lineBlocks(fh):
+        # Always end on a newline so the next file starts on its own line
+        if not block.endswith(b'\n'):
+            block += b'\n'
+        # Most blocks hold no '@' line and are copied as they are
+        if _hasHeaderLine(block):
+            block = b''.join(line + b'\n' for line in block.split(b'\n')[:-1]
+                             if not line.startswith(b'@'))
+        out.write(block)
+
 # mergeSAM
 #    Merges SAM files keeping header from first file in list
 #    INPUT:
 #        samList = list of full filepaths to SAM files to merge
 #    OUTPUT:
-#        outSam = full filepath to desired output location
+#        outSam = full filepath to desired output location. Output is
+#            gzip compressed if the name ends with '.gz'
 def mergeSAM(samList, outSam):
-    # First grep grabs header from first file
-    # Second grep grabs sequence alignments from all files
-    os.system('grep ^@ %s > %s' % (samList[0], outSam))
-    for fh in samList:
-        os.system('grep -v ^@ %s >> %s' % (fh, outSam))
+    if outSam.endswith('.gz'):
+        # Fastest compression level, the merge is throughput bound
+        out = io.BufferedWriter(gzip.open(outSam, 'wb', compresslevel=1),
+                                buffer_size=1 << 20)
+    else:
+        out = open(outSam, 'wb', buffering=1 << 20)
+    with out:
+        for i, sam in enumerate(samList):
+            with open(sam, 'rb') as fh:
+                _copySAMRecords(fh, out, keepHeader=(i == 0))
         
 # dccToTSV
 #    Convert DCC File to TSV File
@@ -277,17 +618,14 @@ def dccToTSV(dccfilename, tsvfilename):
 #        df = pandas data frame with first column being Sample_ID
 #            and remaining columns corresponding to analyte/target/tile
 def generateCountTable(dccobjs):
-    rstnames = list(set(
-        [ analyte for dcc in dccobjs for analyte in dcc.codesum.keys() ]
-        ))
-    rstnames.sort()
-    df = pd.DataFrame()
-    for dcc in dccobjs:
-        orderedCounts = [dcc.codesum.get(rst, [0]*99)[dcc.countcol] for rst in rstnames]
-        df[dcc.scanattribs['ID']] = orderedCounts
-    
-    df = df.transpose()
-    df.columns = rstnames
+    # pd.concat needs at least one series
+    if not dccobjs:
+        return pd.DataFrame({'Sample_ID': pd.Series(dtype='int64')})
+    # One series per sample, aligned on analyte name in a single concat
+    df = pd.concat([ pd.Series(dcc.analytecounts(), name=dcc.scanattribs['ID'],
+                               dtype='int64')
+                     for dcc in dccobjs ], axis=1).transpose()
+    df = df.fillna(0).astype('int64').sort_index(axis=1)
     df.insert(0, 'Sample_ID', df.index.values)
     df.index = range(len(df.index))
     
@@ -348,20 +686,21 @@ class summaryInfo(object):
     #        stepFile = file for summary stat
     #        sampLog = logger to report to
     #        forceVal = known summary value to override file analysis
+    #            (e.g. aligned count from an earlier scanSAM call)
     #    OUTPUT:
     #        boolean. True if summary value > 0. False if summary value == 0.
-    def update(self, step, stepFile, forceVal=0):
+    def update(self, step, stepFile, forceVal=None):
         if step not in self.steps:
             raise Exception('%s not recognized as summary step.' % step)
         # Check if a forced value is desired
-        if forceVal != 0:
+        if forceVal is not None:
             v = forceVal
         # Process fastq file for sequence count
         elif stepFile.endswith(('fq', 'fastq', 'fastq.gz')):
             v = fastqReads(stepFile)
         # Other methods unsupported
         elif stepFile.endswith('sam'):
-            aln, _unaln, _targs = samSummary(stepFile)
+            aln, _unaln, _targs = scanSAM(stepFile)
             v = aln
         else:
             v = 0
@@ -395,6 +734,98 @@ class summaryInfo(object):
             self.fRoot, ', '.join([ "%s: %d" % (step, self.vals[step]) 
                                   for step in self.steps ]))
         
+# _parseDCC
+#    Parse a DCC/DCC-like file. Results are memoized on absolute file
+#        name and file stamp so a DCC that is read several times in one
+#        session (dccToTSV, generateCountTable, ...) is only parsed once.
+#        Everything returned is immutable so the cached value cannot be
+#        changed through a dccfile instance.
+#    INPUT:
+#        dccfileName = absolute path to DCC file
+#        stamp = (modification time in ns, size, inode) of the file,
+#            cache key only. Size and inode catch rewrites within one
+#            mtime tick.
+#    OUTPUT:
+#        tuple of header, scan attribute, ngs processing attribute and
+#            code summary (key, value) pairs, the code summary column
+#            labels and the name and count column indices
+@functools.lru_cache(maxsize=256)
+def _parseDCC(dccfileName, stamp):
+    header = collections.OrderedDict()
+    scanattribs = collections.OrderedDict()
+    ngsattribs = collections.OrderedDict()
+    codelabs = []
+    codesum = collections.OrderedDict()
+    namecol = 0
+    countcol = 0
+    # Read whole file, DCC files are small
+    with open(dccfileName) as fh:
+        lines = fh.read().split('\n')
+    # Flag variables to identify location in file
+    section = ''
+    codeSummaryStarted = False
+    # Loop through file
+    for line in lines:
+        line = line.rstrip()
+        # Skip blank lines
+        if not line:
+            continue
+        # Section tags are the only lines starting with '<'
+        if line[0] == '<':
+            # Section end resets section, section start sets its name
+            section = '' if line[1:2] == '/' else line.strip('<>')
+            continue
+        # Split line by ','
+        line = line.split(',')
+        # Store line as header info if in header section
+        if section == 'Header':
+            header[line[0]] = line[1]
+        # Store line as sample info if in sample attributes section
+        elif section == 'Scan_Attributes':
+            scanattribs[line[0]] = line[1]
+        # Store line as lane info if in late attributes section
+        elif section == 'NGS_Processing_Attributes':
+            if len(line)<2:
+                print('Skipping line '+str(line[0])+' to avoid version-specific formatting differences.')
+            else:
+                ngsattribs[line[0]] = line[1]
+        # Need to do special stuff in code summary section
+        elif section == 'Code_Summary':
+            # If this is the first line of the code summary section
+            # store as column labels
+            try:
+                if not codeSummaryStarted:
+                    codelabs = line
+                    codeSummaryStarted = True
+                    namecol = line.index('Name')
+                    countcol = line.index('Count')
+                    logging.debug("Using old DCC File Format")
+                # If this is not the first line of the code summary section
+                # store the line info in the ordered dictionary
+                else:
+                    nm = line[namecol]
+                    if nm in codesum:
+                        raise Exception('Repeat analyte in Code_Summary')
+                    codesum[nm] = line
+
+            except ValueError: 
+                logging.debug("Using new DCC File Format")
+                codeSummaryStarted = True
+                codelabs = ['Name', 'Count']
+                namecol = 0
+                countcol = 1 
+                nm = line[namecol]
+                if nm in codesum:
+                    raise Exception('Repeat analyte in Code_Summary')
+                codesum[nm] = line
+        # Do you even know where we are?
+        else:
+            logging.warning('Unrecognized Section.')
+    return (tuple(header.items()), tuple(scanattribs.items()),
+            tuple(ngsattribs.items()), tuple(codelabs),
+            tuple((nm, tuple(row)) for nm, row in codesum.items()),
+            namecol, countcol)
+
 # dccfile
 #    Object representing a DCC
 #    ATTRIBUTES:
@@ -456,71 +887,19 @@ class dccfile(object):
     #    OUTPUT:
     #        None. Populates attributes.
     def importDCC(self, dccfileName):
-        # Open file
-        with open(dccfileName) as fh:
-            # Flag variables to identify location in file
-            section = ''
-            codeSummaryStarted = False
-            # Loop through file
-            for line in fh:
-                line = line.rstrip()
-                # Skip blank lines
-                if line == '':
-                    continue
-                # Check if section end and reset section
-                if line.startswith('</'):
-                    section = ''
-                    continue
-                # Check if section start and get section name
-                elif line.startswith('<'):
-                    section = re.sub('<|>', '', line)
-                    continue
-                # Split line by ','
-                line = line.split(',')
-                # Store line as header info if in header section
-                if section == 'Header':
-                    self.header[line[0]] = line[1]
-                # Store line as sample info if in sample attributes section
-                elif section == 'Scan_Attributes':
-                    self.scanattribs[line[0]] = line[1]
-                # Store line as lane info if in late attributes section
-                elif section == 'NGS_Processing_Attributes':
-                    if len(line)<2:
-                        print('Skipping line '+str(line[0])+' to avoid version-specific formatting differences.')
-                    else:
-                        self.ngsattribs[line[0]] = line[1]
-                # Need to do special stuff in code summary section
-                elif section == 'Code_Summary':
-                    # If this is the first line of the code summary section
-                    # store as column labels
-                    try:
-                        if not codeSummaryStarted:
-                            self.codelabs = line
-                            codeSummaryStarted = True
-                            self.namecol = line.index('Name')
-                            self.countcol = line.index('Count')
-                            logging.debug("Using old DCC File Format")
-                        # If this is not the first line of the code summary section
-                        # store the line info in the ordered dictionary
-                        else:
-                            nm = line[self.namecol]
-                            if nm in self.codesum:
-                                raise Exception('Repeat analyte in Code_Summary')
-                            self.codesum[nm] = line
-
-                    except ValueError: 
-                        logging.debug("Using new DCC File Format")
-                        codeSummaryStarted = True
-                        self.codelabs = ['Name', 'Count']
-                        self.namecol = 0
-                        self.countcol = 1 
-                        nm = line[self.namecol]
-                        if nm in self.codesum:
-                            raise Exception('Repeat analyte in Code_Summary')
-                        self.codesum[nm] = line
-                # Do you even know where we are?
-                else:
-                    logging.warning('Unrecognized Section.')
+        # Absolute path so a relative name read again after a chdir is
+        # not served from the cache
+        dccfileName = os.path.abspath(dccfileName)
+        st = os.stat(dccfileName)
+        (header, scanattribs, ngsattribs, codelabs, codesum,
+         self.namecol, self.countcol) = _parseDCC(
+             dccfileName, (st.st_mtime_ns, st.st_size, st.st_ino))
+        self.header = collections.OrderedDict(header)
+        self.scanattribs = collections.OrderedDict(scanattribs)
+        self.ngsattribs = collections.OrderedDict(ngsattribs)
+        self.codelabs = list(codelabs)
+        self.codesum = collections.OrderedDict(
+            (nm, list(row)) for nm, row in codesum)
         
     # listattributes
     #    Return string of column labels for summary section
@@ -654,12 +1033,14 @@ class dccfile(object):
     #        owner = file owner
     #        comments = any extra information
     #        seqKit = sequencing kit used
-    #        dateTag = date of dcc generation
+    #        dateTag = date of dcc generation (defaults to today)
     
     def countlessdcc(self, sumObj, comments='', 
                      plateid='P1012207777777', wellid='A01', owner='Nanostring',
                      seqKit='', 
-                     dateTag=datetime.datetime.today().strftime('%Y-%m-%d')):
+                     dateTag=None):
+        if dateTag is None:
+            dateTag = datetime.date.today().isoformat()
         # Fill Information
         self.header = collections.OrderedDict([
             ("FileVersion", file_version),
@@ -0,0 +1,90 @@
+"""
+Parity tests for scanSAM against a plain line-by-line SAM scan.
+
+Run from the repository root with: python -m pytest -q
+"""
+
+import pytest
+
+import DSP_CNV_e1 as dnd
+
+HEADER = '@HD\tVN:1.0\n@SQ\tSN:t1\tLN:30\n@SQ\tSN:t2\tLN:30\n'
+
+CASES = {
+    'empty': '',
+    'header_only': HEADER,
+    'header_only_no_newline': HEADER.rstrip('\n'),
+    'records': (HEADER +
+                'r1_AAA\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tII"I\n'
+                'r2_CCC\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII\n'
+                'r3_GGG\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:0\n'
+                'r4_TTT\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'),
+    'blank_lines': (HEADER + '\n'
+                    'r1_AAA\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n\n\n'
+                    'r2_CCC\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'),
+    'no_final_newline': (HEADER +
+                         'r1_AAA\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+                         'r2_CCC\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII'),
+    'qname_without_underscore': (
+        HEADER + 'read1\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+        'read2\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII\n'),
+    'rname_last_field': ('r1_AAA\t0\tt1\n'
+                         'r2_CCC\t4\t*\n'
+                         'r3_GGG\t0\tt2'),
+    'long_rname': (HEADER +
+                   'r1_AAA\t0\t%s\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+                   'r2_CCC\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+                   'r3_GGG\t0\t%s' % ('L' * 2000, 'M' * 5000)),
+    'nul_rname': (HEADER +
+                  'r1_AAA\t0\tt1\x00\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+                  'r2_CCC\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'),
+    'crlf': (HEADER.replace('\n', '\r\n') +
+             'r1_AAA\t0\tt1\r\n'
+             'r2_CCC\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\r\n'
+             '\r\n'
+             'r3_GGG\t4\t*\r\n'),
+}
+
+# Line-by-line reference: the per-record logic scanSAM replaced
+def referenceScan(path):
+    aligned = 0
+    unaligned = 0
+    tags = {}
+    with open(path, newline='') as fh:
+        for line in fh:
+            fields = line.rstrip('\r\n').split('\t')
+            if fields[0] == '' or fields[0].startswith('@'):
+                continue
+            if fields[2] == '*':
+                unaligned += 1
+            else:
+                aligned += 1
+                tags[fields[2]] = tags.get(fields[2], 0) + 1
+    return aligned, unaligned, tags
+
+def writeSam(tmp_path, name):
+    path = tmp_path / ('%s.sam' % name)
+    path.write_bytes(CASES[name].encode())
+    return str(path)
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_scanSAM_matches_reference(tmp_path, name):
+    sam = writeSam(tmp_path, name)
+    aligned, unaligned, tags = dnd.scanSAM(sam)
+    refAligned, refUnaligned, refTags = referenceScan(sam)
+    assert (aligned, unaligned) == (refAligned, refUnaligned)
+    # Tag order matters, it is the Code_Summary order in samToDCC
+    assert list(tags.items()) == list(refTags.items())
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_scanSAM_small_blocks(tmp_path, monkeypatch, name):
+    # Force lines to straddle block boundaries
+    samBlocks = dnd._samBlocks
+    monkeypatch.setattr(dnd, '_samBlocks',
+                        lambda sam: samBlocks(sam, blockSize=7))
+    sam = writeSam(tmp_path, name)
+    assert dnd.scanSAM(sam) == referenceScan(sam)
+
+def test_samSummary_order(tmp_path):
+    sam = writeSam(tmp_path, 'records')
+    assert dnd.samSummary(sam) == (1, 3, {'t1': 2, 't2': 1})
@@ -0,0 +1,53 @@
+"""
+Tests for splitSAM against the per-tag files the original in-memory
+split produced.
+
+Run from the repository root with: python -m pytest -q
+"""
+
+import pytest
+
+import DSP_CNV_e1 as dnd
+
+# Interleaved tags so files are closed and reopened with a small maxOpen,
+# with an '@' line after the first record that belongs in every header
+SAM = ('@HD\tVN:1.0\n'
+       'r1_AAA\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       'r2_CCC\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       '@CO\tlate\n'
+       'r3_GGG\t0\tt3\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       'r4_AAA\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII\n'
+       'r5_TTT\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       'r6_CCC\t0\tt2\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       'r7_AAA\t0\tt1\t1\t42\t4M\t*\t0\t0\tACGT\tIIII\n'
+       'r8_GGG\t0\tt3\t1\t42\t4M\t*\t0\t0\tACGT\tIIII')
+
+# In-memory reference: the split splitSAM replaced
+def referenceSplit(text):
+    header = ''
+    linesByTag = {}
+    umisByTag = {}
+    for line in text.splitlines(True):
+        if line.startswith('@'):
+            header += line
+            continue
+        qId, _flg, tag = line.split('\t')[0:3]
+        if tag != '*':
+            linesByTag.setdefault(tag, []).append(line.rstrip())
+            umisByTag.setdefault(tag, set()).add(qId.split('_')[-1])
+    return { tag: (header + '\n'.join(lines), len(umisByTag[tag]))
+             for tag, lines in linesByTag.items() }
+
+@pytest.mark.parametrize('maxOpen,flushSize', [
+    (1, 1), (2, 1), (2, 60), (1, 1 << 16), (None, 1 << 16)])
+def test_splitSAM_matches_reference(tmp_path, maxOpen, flushSize):
+    sam = tmp_path / 'x.sam'
+    sam.write_bytes(SAM.encode())
+    outFiles, alnCount = dnd.splitSAM(str(sam), maxOpen=maxOpen,
+                                      flushSize=flushSize)
+    assert alnCount == 7
+    expected = referenceSplit(SAM)
+    assert outFiles == { str(tmp_path / ('x_%s.sam' % tag)): nUmis
+                         for tag, (_text, nUmis) in expected.items() }
+    for tag, (text, _nUmis) in expected.items():
+        assert (tmp_path / ('x_%s.sam' % tag)).read_bytes() == text.encode()